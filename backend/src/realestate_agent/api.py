@@ -1,21 +1,37 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from realestate_agent.main import agent, Runner, is_location_query, location_agent, get_session, is_email_query, email_agent
+from fastapi.responses import StreamingResponse
+from openai.types.responses import ResponseTextDeltaEvent
+from realestate_agent.main import agent, Runner, location_agent, get_session_async, email_agent, client, EMAIL_KEYWORDS, LOCATION_KEYWORDS
 from pydantic import BaseModel
 from typing import List, Optional
+from functools import lru_cache
+from contextlib import asynccontextmanager
 import re
-import uuid
+import itertools
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 import random
+import asyncio
+
+try:
+    import re2 as re_fast  # google-re2: linear-time DFA matching
+except ImportError:
+    re_fast = re
 
 # Load environment variables
 BASE_DIR = Path(__file__).resolve().parents[3]
 env_path = BASE_DIR / ".env"
 load_dotenv(dotenv_path=env_path)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await client.close()  # release pooled upstream connections
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +41,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --------- Patterns ---------
+# Flags are inline ((?i)) because re2 takes no flags argument.
+# Token fields are pulled out in one left-to-right scan. At any position the
+# first alternative that matches wins, so links and postcodes come before the
+# numeric fields and a bare number is only a price if it isn't a bed/bath count.
+# Counts must sit on the same line as bed/bath, so "Rent 1800\nBeds: 2" keeps its price.
+_FIELDS_RE = re_fast.compile(
+    r'(?i)(?-i:(?P<link>https?://[^\s]+))'
+    r'|(?-i:(?P<postcode>[A-Z]{1,2}\d{1,2}[A-Z]?\s*\d[A-Z]{2}))'
+    r'|(?P<bedrooms>\d+)[ \t]*(?:bed|bedroom)'
+    r'|(?P<bathrooms>\d+)[ \t]*(?:bath|bathroom)'
+    r'|£?(?P<price>\d+(?:,\d+)?)'
+)
+_FIELD_COUNT = 5
+_LOCATION_RES = [
+    re_fast.compile(r'(?i)(?:in|at)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'),
+    re_fast.compile(r'(?i)Location[:\s-]+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'),
+    re_fast.compile(r'(?i)([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s*(?:flat|apartment|house|studio|room)'),
+]
+# The property type is the group name of the first type keyword mentioned
+_PROPTYPE_RE = re_fast.compile(
+    r'(?i)(?P<room>\broom\b)'
+    r'|(?P<studio>\bstudio\b)'
+    r'|(?P<house>\bhouse\b|detached|semi-detached)'
+    r'|(?P<apartment>\bapartment\b|flat)'
+)
+TRAVEL_KEYWORDS = ("travel time", "duration", "how long", "distance", "commute", "minutes away", "travel from")
+# One pass over the prompt classifies it against every keyword set; where sets
+# overlap ("distance") the earlier group wins, matching the routing priority.
+_QUERY_TYPE_RE = re_fast.compile(
+    "(?i)(?P<email_draft>" + "|".join(EMAIL_KEYWORDS) + ")"
+    "|(?P<travel>" + "|".join(TRAVEL_KEYWORDS) + ")"
+    "|(?P<location>" + "|".join(LOCATION_KEYWORDS) + ")"
+)
+
 # --------- Models ---------
 class UserQuery(BaseModel):
     prompt: str
@@ -47,6 +98,10 @@ class PropertyData(BaseModel):
     postcode: Optional[str] = None
 
 # --------- Enhanced Property Parser ---------
+# Property ids: a counter seeded with the pid, unique across uvicorn workers
+# without a urandom read per property
+_PROPERTY_IDS = itertools.count(os.getpid() << 32)
+
 def parse_agent_response(response_text: str) -> List[PropertyData]:
     """Enhanced property parser with better card information"""
     print(f"=== PARSING RESPONSE ===")
@@ -54,52 +109,35 @@ def parse_agent_response(response_text: str) -> List[PropertyData]:
     
     properties = []
     
+    # Price, bedrooms, bathrooms, postcode and link in a single pass (first match wins)
+    fields = {}
+    for match in _FIELDS_RE.finditer(response_text):
+        fields.setdefault(match.lastgroup, match.group(match.lastgroup))
+        if len(fields) == _FIELD_COUNT:
+            break
+    
     # Extract price
-    price_match = re.search(r'£?(\d+(?:,\d+)?)', response_text)
-    price = float(price_match.group(1).replace(',', '')) if price_match else random.randint(800, 2500)
+    price = float(fields['price'].replace(',', '')) if 'price' in fields else random.randint(800, 2500)
     
     # Extract location with better pattern matching
-    location_patterns = [
-        r'(?:in|at)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-        r'Location[:\s-]+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s*(?:flat|apartment|house|studio|room)'
-    ]
-    
     location = "London"
-    for pattern in location_patterns:
-        match = re.search(pattern, response_text, re.IGNORECASE)
+    for pattern in _LOCATION_RES:
+        match = pattern.search(response_text)
         if match:
             location = match.group(1).strip()
             break
     
     # Property type detection
-    property_type = "flat"
-    property_type_keywords = {
-        "room": r'\broom\b',
-        "studio": r'\bstudio\b', 
-        "house": r'\bhouse\b|detached|semi-detached',
-        "apartment": r'\bapartment\b|flat'
-    }
-    
-    for prop_type, pattern in property_type_keywords.items():
-        if re.search(pattern, response_text, re.IGNORECASE):
-            property_type = prop_type
-            break
+    type_match = _PROPTYPE_RE.search(response_text)
+    property_type = type_match.lastgroup if type_match else "flat"
     
     # Bedrooms and bathrooms
-    bedrooms_match = re.search(r'(\d+)\s*(?:bed|bedroom)', response_text, re.IGNORECASE)
-    bedrooms = int(bedrooms_match.group(1)) if bedrooms_match else random.randint(1, 3)
+    bedrooms = int(fields['bedrooms']) if 'bedrooms' in fields else random.randint(1, 3)
+    bathrooms = int(fields['bathrooms']) if 'bathrooms' in fields else (1 if bedrooms <= 2 else 2)
     
-    bathrooms_match = re.search(r'(\d+)\s*(?:bath|bathroom)', response_text, re.IGNORECASE)
-    bathrooms = int(bathrooms_match.group(1)) if bathrooms_match else (1 if bedrooms <= 2 else 2)
-    
-    # Postcode extraction
-    postcode_match = re.search(r'([A-Z]{1,2}\d{1,2}[A-Z]?\s*\d[A-Z]{2})', response_text)
-    postcode = postcode_match.group(1) if postcode_match else None
-    
-    # Link extraction
-    link_match = re.search(r'https?://[^\s]+', response_text)
-    link = link_match.group(0) if link_match else None
+    # Postcode and link
+    postcode = fields.get('postcode')
+    link = fields.get('link')
     
     # Create better title and description
     title = generate_property_title(property_type, location, bedrooms, price)
@@ -109,7 +147,7 @@ def parse_agent_response(response_text: str) -> List[PropertyData]:
     
     # Create property object with enhanced info
     property_obj = PropertyData(
-        id=str(uuid.uuid4()),
+        id=f"{next(_PROPERTY_IDS):x}",
         title=title,
         location=location,
         price=price,
@@ -126,17 +164,35 @@ def parse_agent_response(response_text: str) -> List[PropertyData]:
     print(f"✅ Created property: {property_obj.title}")
     return properties
 
+# Long responses are parsed in a worker thread (capped) to keep the event loop free
+PARSE_OFFLOAD_THRESHOLD = 2048
+_PARSE_SLOTS = asyncio.Semaphore(4)
+
+async def parse_agent_response_async(response_text: str) -> List[PropertyData]:
+    """parse_agent_response, offloaded to a thread for long responses"""
+    if len(response_text) <= PARSE_OFFLOAD_THRESHOLD:
+        return parse_agent_response(response_text)
+    async with _PARSE_SLOTS:
+        return await asyncio.to_thread(parse_agent_response, response_text)
+
+_PROPERTY_TYPE_NAMES = {
+    "room": "Room",
+    "studio": "Studio Apartment", 
+    "house": "House",
+    "flat": "Apartment",
+    "apartment": "Apartment"
+}
+# Exactly four templates, so two random bits pick one uniformly
+_TITLE_TEMPLATES = (
+    "{bedrooms}{type} in {area}",
+    "Modern {bedrooms}{type} in {location}",
+    "Luxury {bedrooms}{type} - {area}",
+    "Spacious {bedrooms}{type} in {location}",
+)
+
 def generate_property_title(property_type: str, location: str, bedrooms: int, price: float) -> str:
     """Generate a professional property title"""
-    property_types = {
-        "room": "Room",
-        "studio": "Studio Apartment", 
-        "house": "House",
-        "flat": "Apartment",
-        "apartment": "Apartment"
-    }
-    
-    type_display = property_types.get(property_type, "Property")
+    type_display = _PROPERTY_TYPE_NAMES.get(property_type, "Property")
     
     # Add bedroom info if available
     if bedrooms > 0 and property_type != "room":
@@ -152,71 +208,128 @@ def generate_property_title(property_type: str, location: str, bedrooms: int, pr
         area = location
     
     # Create professional title
-    titles = [
-        f"{bedroom_text}{type_display} in {area}",
-        f"Modern {bedroom_text}{type_display} in {location}",
-        f"Luxury {bedroom_text}{type_display} - {area}",
-        f"Spacious {bedroom_text}{type_display} in {location}"
-    ]
+    template = _TITLE_TEMPLATES[random.getrandbits(2)]
+    return template.format(bedrooms=bedroom_text, type=type_display, area=area, location=location)
+
+_UK_LOCATIONS = {
+    # London areas
+    'london': (51.5074, -0.1278),
+    'camden': (51.5392, -0.1426),
+    'islington': (51.5416, -0.1022),
+    'hackney': (51.5450, -0.0553),
+    'shoreditch': (51.5255, -0.0754),
+    'clapham': (51.4618, -0.1700),
+    'wimbledon': (51.4214, -0.2064),
+    'richmond': (51.4613, -0.3037),
+    'greenwich': (51.4934, 0.0098),
+    'kensington': (51.4988, -0.1749),
+    'chelsea': (51.4875, -0.1687),
+    
+    # Major UK cities
+    'manchester': (53.4808, -2.2426),
+    'birmingham': (52.4862, -1.8904),
+    'liverpool': (53.4084, -2.9916),
+    'leeds': (53.8008, -1.5491),
+    'glasgow': (55.8642, -4.2518),
+    'edinburgh': (55.9533, -3.1883),
+    'bristol': (51.4545, -2.5879),
+    'cardiff': (51.4816, -3.1791),
+    'belfast': (54.5973, -5.9301),
+    'newcastle': (54.9783, -1.6178),
+    'sheffield': (53.3811, -1.4701),
+    'nottingham': (52.9548, -1.1581),
     
-    return random.choice(titles)
+    # Other popular areas
+    'brighton': (50.8225, -0.1372),
+    'cambridge': (52.2053, 0.1218),
+    'oxford': (51.7520, -1.2577),
+    'bath': (51.3758, -2.3599),
+    'york': (53.9600, -1.0873)
+}
+# Every known city in one alternation (longest first), so the partial-match
+# fallback is a single scan of the input however many cities are listed
+_UK_CITY_RE = re_fast.compile("|".join(sorted(_UK_LOCATIONS, key=len, reverse=True)))
 
+@lru_cache(maxsize=4096)
 def get_coordinates(location: str) -> tuple[float, float]:
     """Enhanced coordinate lookup with more UK locations"""
-    uk_locations = {
-        # London areas
-        'london': (51.5074, -0.1278),
-        'camden': (51.5392, -0.1426),
-        'islington': (51.5416, -0.1022),
-        'hackney': (51.5450, -0.0553),
-        'shoreditch': (51.5255, -0.0754),
-        'clapham': (51.4618, -0.1700),
-        'wimbledon': (51.4214, -0.2064),
-        'richmond': (51.4613, -0.3037),
-        'greenwich': (51.4934, 0.0098),
-        'kensington': (51.4988, -0.1749),
-        'chelsea': (51.4875, -0.1687),
-        
-        # Major UK cities
-        'manchester': (53.4808, -2.2426),
-        'birmingham': (52.4862, -1.8904),
-        'liverpool': (53.4084, -2.9916),
-        'leeds': (53.8008, -1.5491),
-        'glasgow': (55.8642, -4.2518),
-        'edinburgh': (55.9533, -3.1883),
-        'bristol': (51.4545, -2.5879),
-        'cardiff': (51.4816, -3.1791),
-        'belfast': (54.5973, -5.9301),
-        'newcastle': (54.9783, -1.6178),
-        'sheffield': (53.3811, -1.4701),
-        'nottingham': (52.9548, -1.1581),
-        
-        # Other popular areas
-        'brighton': (50.8225, -0.1372),
-        'cambridge': (52.2053, 0.1218),
-        'oxford': (51.7520, -1.2577),
-        'bath': (51.3758, -2.3599),
-        'york': (53.9600, -1.0873)
-    }
-    
     clean_location = location.lower().strip()
     
     # Direct match
-    if clean_location in uk_locations:
-        return uk_locations[clean_location]
+    coords = _UK_LOCATIONS.get(clean_location)
+    if coords is not None:
+        return coords
     
-    # Partial match (check if any location keyword is in the query)
-    for city, coords in uk_locations.items():
-        if city in clean_location:
-            return coords
+    # Partial match (first known city mentioned in the query)
+    match = _UK_CITY_RE.search(clean_location)
+    if match:
+        return _UK_LOCATIONS[match.group(0)]
     
     # Default to central London
     return (51.5074, -0.1278)
 
-def is_travel_query(query: str) -> bool:
-    """Check if it's a travel query"""
-    keywords = ["travel time", "duration", "how long", "distance", "commute", "minutes away", "travel from"]
-    return any(keyword in query.lower() for keyword in keywords)
+@lru_cache(maxsize=8192)
+def classify_query(query: str) -> str:
+    """Classify a prompt as email_draft, travel, location or property_search"""
+    found = set()
+    for match in _QUERY_TYPE_RE.finditer(query):
+        if match.lastgroup == "email_draft":
+            return "email_draft"
+        found.add(match.lastgroup)
+    
+    if "travel" in found:
+        return "travel"
+    if "location" in found:
+        return "location"
+    return "property_search"
+
+# --------- Agent Runs ---------
+# In-flight runs keyed by (agent, session, normalized prompt). The session is part
+# of the key so a run never answers from, or writes into, another user's history.
+_INFLIGHT: dict[tuple[str, str, str], asyncio.Task] = {}
+
+def _inflight_key(assistant, prompt: str, session_id: str) -> tuple[str, str, str]:
+    return (assistant.name, session_id, " ".join(prompt.lower().split()))
+
+async def run_agent(assistant, prompt: str, session_id: str):
+    """Run an agent, joining an identical run that is already in flight (e.g. a double submit)"""
+    key = _inflight_key(assistant, prompt, session_id)
+    task = _INFLIGHT.get(key)
+    if task is None:
+        session = await get_session_async(session_id)
+        task = _INFLIGHT.get(key)  # another request may have started it meanwhile
+        if task is None:
+            task = asyncio.create_task(Runner.run(assistant, input=prompt, session=session))
+            _INFLIGHT[key] = task
+            task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+    # shield: one client disconnecting must not cancel the run others are waiting on
+    return await asyncio.shield(task)
+
+_QUERY_AGENTS = {
+    "email_draft": email_agent,
+    "travel": location_agent,
+    "location": location_agent,
+    "property_search": agent,
+}
+
+async def _response_payload(query_type: str, session_id: str, output: str) -> dict:
+    """Build the response body shared by the JSON and streaming endpoints"""
+    payload = {
+        "result": output,
+        "properties": [],
+        "query_type": query_type,
+        "session_id": session_id
+    }
+    if query_type == "property_search":
+        properties = await parse_agent_response_async(output)
+        payload["properties"] = [prop.model_dump() for prop in properties]
+        payload["total_properties"] = len(properties)
+    return payload
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 # --------- API Routes ---------
 @app.get("/")
@@ -234,60 +347,64 @@ async def realestate_agent(query: UserQuery):
         
         print(f"🔍 Query: {prompt}")
         
-        # Get session and run agent
-        session = get_session(session_id)
-        
-        if is_email_query(prompt):
-            result = await Runner.run(email_agent, input=prompt, session=session)
-            print("📧 Email Agent called")
-            
-            return {
-                "result": result.final_output,
-                "properties": [],
-                "query_type": "email_draft",
-                "session_id": session_id
-            }
-        
-        elif is_travel_query(prompt):
-            result = await Runner.run(location_agent, input=prompt, session=session)
-            print("🚗 Travel query")
-            
-            return {
-                "result": result.final_output,
-                "properties": [],
-                "query_type": "travel",
-                "session_id": session_id
-            }
+        # Classify and run agent
+        query_type = classify_query(prompt)
+        assistant = _QUERY_AGENTS[query_type]
+        result = await run_agent(assistant, prompt, session_id)
+        print(f"🤖 {query_type} handled by {assistant.name}")
         
-        elif is_location_query(prompt):
-            result = await Runner.run(location_agent, input=prompt, session=session)
-            print("📍 Location query")
-            
-            return {
-                "result": result.final_output,
-                "properties": [],
-                "query_type": "location",
-                "session_id": session_id
-            }
-        
-        else:
-            # Property search
-            result = await Runner.run(agent, input=prompt, session=session)
-            print("🏠 Property search")
-            properties = parse_agent_response(result.final_output)
-            
-            return {
-                "result": result.final_output,
-                "properties": [prop.dict() for prop in properties],
-                "query_type": "property_search",
-                "total_properties": len(properties),
-                "session_id": session_id
-            }
+        return await _response_payload(query_type, session_id, result.final_output)
             
     except Exception as e:
         print(f"❌ Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/realestate-agent/stream")
+async def realestate_agent_stream(query: UserQuery):
+    """Same routing as /realestate-agent, streamed as server-sent events.
+
+    Emits {"delta": ...} events as the model writes, then one "done" event with
+    the same payload /realestate-agent returns (or an "error" event).
+    """
+    session_id = query.session_id
+    prompt = query.prompt
+    
+    if not session_id.strip():
+        raise HTTPException(status_code=400, detail="Session ID required")
+    
+    print(f"🔍 Streaming query: {prompt}")
+    query_type = classify_query(prompt)
+    assistant = _QUERY_AGENTS[query_type]
+    session = await get_session_async(session_id)
+    
+    async def events():
+        result = None
+        try:
+            pending = _INFLIGHT.get(_inflight_key(assistant, prompt, session_id))
+            if pending is not None:
+                # An identical run is already in flight: wait for it instead of starting another
+                output = (await asyncio.shield(pending)).final_output
+            else:
+                # Not registered in _INFLIGHT: this run is cancelled if its client goes away
+                result = Runner.run_streamed(assistant, input=prompt, session=session)
+                async for event in result.stream_events():
+                    if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                        yield _sse({"delta": event.data.delta})
+                output = result.final_output
+            
+            yield _sse(await _response_payload(query_type, session_id, output), event="done")
+        
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            yield _sse({"detail": str(e)}, event="error")
+        
+        finally:
+            # Client disconnected mid-stream: stop the agent rather than let it finish into the session
+            if result is not None and not result.is_complete:
+                result.cancel()
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
@@ -1,10 +1,25 @@
 from agents import Agent, Runner, function_tool, handoff, SQLiteSession, OpenAIChatCompletionsModel, set_tracing_disabled, set_default_openai_api, set_default_openai_client
 from agents.tool import WebSearchTool
 from pydantic import BaseModel
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from prompt_toolkit import PromptSession
 from dotenv import load_dotenv
+from collections import OrderedDict
+from functools import lru_cache
 import asyncio
 import os
+import re
+import sqlite3
+
+try:
+    import re2 as re_fast  # google-re2: linear-time DFA matching
+except ImportError:
+    re_fast = re
+
+try:
+    import uvloop  # libuv event loop; not available on Windows
+except ImportError:
+    uvloop = None
 
 load_dotenv()
 
@@ -15,22 +30,57 @@ BASE_URL = "https://api.aimlapi.com/v1"
 MODEL = "openai/gpt-4.1-2025-04-14"
 api_key = os.getenv("OPENAI_API_KEY")
 
+# HTTP/2 lets concurrent agent calls share connections; pool limits stay at the SDK defaults
 client = AsyncOpenAI(
     api_key=api_key,
-    base_url=BASE_URL
+    base_url=BASE_URL,
+    http_client=DefaultAsyncHttpxClient(http2=True),
 )
 set_default_openai_client(client)
 
 # --- Session cache ---
 SESSION_DB = "realestate_agent.db"
-_SESSIONS: dict[str, SQLiteSession] = {}
+SESSION_CACHE_SIZE = 1024
+# SQLiteSession already puts the file in WAL mode; these are per-connection. With
+# WAL, synchronous=NORMAL stays crash-safe but drops the fsync on every commit.
+_SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+class TunedSQLiteSession(SQLiteSession):
+    """SQLiteSession that applies _SQLITE_PRAGMAS to each new thread-local connection.
+
+    Hooks the SDK's private _get_connection/_local/_is_memory_db, which are
+    unchanged across openai-agents 0.2.8-0.2.11; pyproject pins <0.3 for this.
+    """
 
-def get_session(sid: str) -> SQLiteSession:
-    """Reuse per-session-id to avoid re-opening db."""
+    def _get_connection(self) -> sqlite3.Connection:
+        fresh = not self._is_memory_db and not hasattr(self._local, "connection")
+        conn = super()._get_connection()
+        if fresh:
+            for pragma in _SQLITE_PRAGMAS:
+                conn.execute(pragma)
+        return conn
+
+# LRU: most recently used sessions at the end, bounded so the cache doesn't grow forever.
+# An evicted session's thread-local connections are released when it is garbage-collected.
+_SESSIONS: OrderedDict[str, SQLiteSession] = OrderedDict()
+
+def _cache_session(sid: str, s: SQLiteSession) -> SQLiteSession:
+    s = _SESSIONS.setdefault(sid, s)
+    _SESSIONS.move_to_end(sid)
+    while len(_SESSIONS) > SESSION_CACHE_SIZE:
+        _SESSIONS.popitem(last=False)
+    return s
+
+async def get_session_async(sid: str) -> SQLiteSession:
+    """Reuse per-session-id to avoid re-opening db; new sessions (sqlite connect + schema setup) open off the event loop."""
     s = _SESSIONS.get(sid)
     if s is None:
-        s = SQLiteSession(sid, SESSION_DB)
-        _SESSIONS[sid] = s
+        return _cache_session(sid, await asyncio.to_thread(TunedSQLiteSession, sid, SESSION_DB))
+    _SESSIONS.move_to_end(sid)
     return s
 
 # --- Output schema ---
@@ -41,19 +91,19 @@ class Query_Output(BaseModel):
     link: str
     property_type: str
 
-def is_email_query(query: str) -> bool:
-    keywords = [
-        "email", "contact", "reach out", "inquire", "inquiry", "message", "send an email"
-    ]
-    query_lower = query.lower()
-    return any(kw in query_lower for kw in keywords)
+# --- Query keywords ---
+EMAIL_KEYWORDS = (
+    "email", "contact", "reach out", "inquire", "inquiry", "message", "send an email"
+)
+LOCATION_KEYWORDS = (
+    "distance", "how far", "nearest", "close to", "near", "from", "location", "coordinates"
+)
+
+_LOCATION_QUERY_RE = re_fast.compile("(?i)" + "|".join(LOCATION_KEYWORDS))
 
+@lru_cache(maxsize=8192)
 def is_location_query(query: str) -> bool:
-    keywords = [
-        "distance", "how far", "nearest", "close to", "near", "from", "location", "coordinates"
-    ]
-    query_lower = query.lower()
-    return any(kw in query_lower for kw in keywords)
+    return _LOCATION_QUERY_RE.search(query) is not None
 
 @function_tool()
 def user_output(info: Query_Output):
@@ -120,15 +170,26 @@ agent = Agent(
 )
 
 # --- Main loop ---
+async def _warm_up(session_id: str) -> None:
+    """Open the session and the upstream connection while the user is typing."""
+    try:
+        await get_session_async(session_id)
+        await client.models.list()
+    except Exception:
+        pass  # best effort; a real failure surfaces on the first query
+
 async def main():
-    session_id = input("Session ID (e.g., user123): ").strip() or "default"
+    prompt = PromptSession()
+    session_id = (await prompt.prompt_async("Session ID (e.g., user123): ")).strip() or "default"
+    warm_up = asyncio.create_task(_warm_up(session_id))
     while True:
-        user_input = input("User: ")
+        # prompt_async keeps the event loop running (warm-up, etc.) and still honours Ctrl+C
+        user_input = await prompt.prompt_async("User: ")
         if user_input.lower() == "exit":
             print("Exiting...")
             break
         try:
-            session = get_session(session_id)  # <-- per-user session
+            session = await get_session_async(session_id)  # <-- per-user session
             if is_location_query(user_input):
                 result = await Runner.run(location_agent, input=user_input, session=session)
             else:
@@ -138,4 +199,4 @@ async def main():
             print("Error:", e)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
\ No newline at end of file
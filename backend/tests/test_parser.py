@@ -0,0 +1,30 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # main.py builds the client at import
+
+from realestate_agent.api import parse_agent_response
+
+
+def parse_one(text):
+    return parse_agent_response(text)[0]
+
+
+def test_price_is_not_a_bed_count():
+    prop = parse_one("2 bed flat in Camden for £1,200 pcm")
+    assert prop.price == 1200
+    assert prop.bedrooms == 2
+
+
+def test_price_line_followed_by_bedrooms_line():
+    prop = parse_one("Price: 1800\nBedrooms: 2")
+    assert prop.price == 1800
+
+    prop = parse_one("Monthly rent 1800\nBeds: 2")
+    assert prop.price == 1800
+
+
+def test_postcode_and_link():
+    prop = parse_one("Studio in Hackney, E8 3PH, £950. https://www.zoopla.co.uk/to-rent/details/123")
+    assert prop.postcode == "E8 3PH"
+    assert prop.link == "https://www.zoopla.co.uk/to-rent/details/123"
+    assert prop.price == 950